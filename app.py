@@ -6,10 +6,15 @@ app = Flask(__name__)
 # --- Path to the visuals folder ---
 VISUALS_DIR = os.path.join(os.getcwd(), "visuals")
 
+# Visuals only change when the analysis scripts regenerate them
+VISUALS_MAX_AGE = 86400
+
 # --- Serve images dynamically ---
 @app.route("/visuals/<path:filename>")
 def visuals(filename):
-    return send_from_directory(VISUALS_DIR, filename)
+    # Sets Cache-Control max-age on successful responses only (not on 404s);
+    # ETag/Last-Modified let repeat requests come back as 304 without a file read
+    return send_from_directory(VISUALS_DIR, filename, max_age=VISUALS_MAX_AGE, conditional=True)
 
 # --- Specific Captions & Analytical Descriptions ---
 descriptions = {
@@ -40,20 +45,35 @@ descriptions = {
     }
 }
 
-@app.route("/")
-def home():
+# --- Visuals listing, rebuilt only when the folder changes ---
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+_cache = {"mtime": None, "visuals": []}
+
+def list_visuals():
+    try:
+        mtime = os.stat(VISUALS_DIR).st_mtime
+    except FileNotFoundError:
+        return []
+    if mtime == _cache["mtime"]:
+        return _cache["visuals"]
+
     visuals = []
-    if os.path.exists(VISUALS_DIR):
-        for file in os.listdir(VISUALS_DIR):
-            if file.lower().endswith((".png", ".jpg", ".jpeg")):
-                name = os.path.splitext(file)[0]
+    with os.scandir(VISUALS_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                name = os.path.splitext(entry.name)[0]
                 visuals.append({
-                    "filename": file,
+                    "filename": entry.name,
                     "caption": descriptions.get(name, {}).get("caption", name.replace("_", " ").title()),
                     "desc": descriptions.get(name, {}).get("desc", "This visualization provides analytical insight into air quality and climate interactions.")
                 })
     visuals.sort(key=lambda x: x["filename"])
-    return render_template("index.html", visuals=visuals)
+    _cache.update(mtime=mtime, visuals=visuals)
+    return visuals
+
+@app.route("/")
+def home():
+    return render_template("index.html", visuals=list_visuals())
 
 if __name__ == "__main__":
     app.run(debug=True)
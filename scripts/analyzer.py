@@ -5,13 +5,28 @@ Performs data analysis and visualization for Global Air Quality & Temperature da
 """
 
 import os
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: files only, no GUI backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from data_loader import iter_dataset, read_dataset
+
+try:
+    from numba import get_num_threads, njit, prange
+except ImportError:  # numba is optional; bucket_sums falls back to np.bincount
+    njit = None
+
 sns.set(style="whitegrid")
 plt.rcParams["figure.figsize"] = (10, 6)
 
+# One figure reused for every plot (cleared in between) instead of one per plot
+FIG, AX = plt.subplots()
+
 # === PATH SETUP ===
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 VISUALS_DIR = os.path.join(os.path.dirname(__file__), "..", "visuals")
@@ -22,10 +37,11 @@ os.makedirs(VISUALS_DIR, exist_ok=True)
 # 1️⃣ Safe Loader
 # ========================
 def load_dataset(filename):
-    """Load CSV safely with fallback options."""
+    """Load a dataset safely (Parquet copy if present, else the C CSV parser)."""
     path = os.path.join(DATA_DIR, filename)
     try:
-        df = pd.read_csv(path, on_bad_lines="skip", sep=None, engine="python")
+        df = read_dataset(path)
+        df.columns = [c.strip().lower() for c in df.columns]
         print(f"✅ Loaded: {filename} — Shape: {df.shape}")
         return df
     except Exception as e:
@@ -33,96 +49,270 @@ def load_dataset(filename):
         return pd.DataFrame()
 
 
-# === Load all datasets ===
-city_temp = load_dataset("GlobalLandTemperaturesByCity.csv")
-country_temp = load_dataset("GlobalLandTemperaturesByCountry.csv")
-major_city_temp = load_dataset("GlobalLandTemperaturesByMajorCity.csv")
-state_temp = load_dataset("GlobalLandTemperaturesByState.csv")
-global_temp = load_dataset("GlobalTemperatures.csv")
-air_quality = load_dataset("openaq.csv")
+def stream_dataset(filename):
+    """Stream a large CSV chunk by chunk so it never sits in memory whole.
+
+    Read errors propagate, so callers can tell a partial stream from a complete one.
+    """
+    for chunk in iter_dataset(filename):
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        yield chunk
+
 
-print("\n📦 All datasets loaded successfully!\n")
+def iter_chunks(data):
+    """Yield DataFrame chunks from either a DataFrame or a chunk iterator."""
+    if isinstance(data, pd.DataFrame):
+        yield data
+    else:
+        yield from data
+
+
+def air_quality_columns(df):
+    """Resolve the numeric and date columns of an air quality frame once.
+
+    The result is cached in ``df.attrs`` so later sections skip the rescan.
+    """
+    if "numeric_cols" not in df.attrs:
+        df.attrs["numeric_cols"] = df.select_dtypes(include="number").columns.tolist()
+        df.attrs["date_col"] = "last updated" if "last updated" in df.columns else "date"
+    return df.attrs["numeric_cols"], df.attrs["date_col"]
 
 
 # ========================
 # 2️⃣ Helper Functions
 # ========================
+# Column names are stripped and lower-cased once at load time
+TEMPERATURE_COLUMNS = {"averagetemperature", "landaveragetemperature", "meantemperature"}
+
+
 def find_temperature_column(df):
     """Auto-detect temperature column name."""
-    candidates = ["AverageTemperature", "LandAverageTemperature", "MeanTemperature"]
-    for col in df.columns:
-        if col.strip() in candidates:
-            return col.strip()
-    return None
-
+    return next((col for col in df.columns if col in TEMPERATURE_COLUMNS), None)
+
+
+def new_summary():
+    """Empty accumulator for update_summary()."""
+    return {"rows": 0, "stats": None, "uniques": {}}
+
+
+def update_summary(summary, chunk):
+    """Fold one chunk's numeric stats and categorical values into the accumulator."""
+    summary["rows"] += len(chunk)
+    # Distinct values per categorical column, unioned so streamed input keeps its "unique" row
+    for col in chunk.select_dtypes(include="category").columns:
+        summary["uniques"].setdefault(col, set()).update(chunk[col].dropna().unique())
+
+    numeric = chunk.select_dtypes(include="number")
+    count = numeric.count()
+    part = pd.DataFrame({
+        "count": count,
+        "mean": numeric.mean(),
+        "m2": numeric.var(ddof=0) * count,
+        "min": numeric.min(),
+        "max": numeric.max(),
+    }).astype("float64")
+    part[["mean", "m2"]] = part[["mean", "m2"]].fillna(0.0)
+    stats = summary["stats"]
+    if stats is None:
+        summary["stats"] = part
+        return
 
-def dataset_summary(df, name):
-    """Generate summary stats and save."""
-    if df.empty:
+    # Chan et al. pairwise update keeps the variance numerically stable
+    total = stats["count"] + part["count"]
+    weight = (part["count"] / total).fillna(0.0)
+    delta = part["mean"] - stats["mean"]
+    stats["m2"] += part["m2"] + delta ** 2 * stats["count"] * weight
+    stats["mean"] += delta * weight
+    stats["min"] = np.fmin(stats["min"], part["min"])
+    stats["max"] = np.fmax(stats["max"], part["max"])
+    stats["count"] = total
+
+
+def finish_summary(summary):
+    """describe()-style count/mean/std/min/max rows, plus "unique" for categoricals."""
+    parts = []
+    stats = summary["stats"]
+    if stats is not None and not stats.empty:
+        has_rows = stats["count"] > 0
+        parts.append(pd.DataFrame({
+            "count": stats["count"],
+            "mean": stats["mean"].where(has_rows),
+            "std": np.sqrt(stats["m2"] / (stats["count"] - 1)).where(stats["count"] > 1),
+            "min": stats["min"],
+            "max": stats["max"],
+        }).T)
+    if summary["uniques"]:
+        parts.append(pd.DataFrame(
+            [{col: len(values) for col, values in summary["uniques"].items()}], index=["unique"]
+        ))
+    return pd.concat(parts) if parts else pd.DataFrame()
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _bucket_sums_kernel(idx, values, n_buckets, n_parts):
+        # Each thread owns one row block and its own accumulator row, so the
+        # scatter-adds never race; the rows are folded together at the end.
+        part_sums = np.zeros((n_parts, n_buckets))
+        part_counts = np.zeros((n_parts, n_buckets), dtype=np.int64)
+        step = (len(idx) + n_parts - 1) // n_parts
+        for p in prange(n_parts):
+            for i in range(p * step, min((p + 1) * step, len(idx))):
+                v = values[i]
+                if not np.isnan(v):
+                    part_sums[p, idx[i]] += v
+                    part_counts[p, idx[i]] += 1
+
+        sums = np.zeros(n_buckets)
+        counts = np.zeros(n_buckets, dtype=np.int64)
+        for p in range(n_parts):
+            sums += part_sums[p]
+            counts += part_counts[p]
+        return sums, counts
+
+
+def bucket_sums(idx, values, n_buckets):
+    """Per-bucket sum and count of non-NaN values, bucket = idx (0..n_buckets-1)."""
+    if njit is not None:
+        return _bucket_sums_kernel(idx, values, n_buckets, get_num_threads())
+    valid = ~np.isnan(values)
+    sums = np.bincount(idx[valid], weights=values[valid], minlength=n_buckets)
+    counts = np.bincount(idx[valid], minlength=n_buckets)
+    return sums, counts
+
+
+def save_summary(summary, name):
+    """Write an accumulated summary to /visuals, or report why there is none."""
+    if summary["rows"] == 0:
         print(f"⚠️ Skipping {name} — empty dataset.")
         return
-    summary = df.describe(include="all")
-    summary.to_csv(os.path.join(VISUALS_DIR, f"{name}_summary.csv"))
+    table = finish_summary(summary)
+    if table.empty:
+        print(f"⚠️ Skipping {name} — no numeric or categorical columns.")
+        return
+    table.to_csv(os.path.join(VISUALS_DIR, f"{name}_summary.csv"))
     print(f"📊 Saved summary for {name}")
 
 
-# Generate summaries
-dataset_summary(city_temp, "city_temp")
-dataset_summary(country_temp, "country_temp")
-dataset_summary(major_city_temp, "major_city_temp")
-dataset_summary(state_temp, "state_temp")
-dataset_summary(global_temp, "global_temp")
-dataset_summary(air_quality, "air_quality")
+def dataset_summary(data, name):
+    """Generate summary stats and save (streamed when given chunks)."""
+    summary = new_summary()
+    for chunk in iter_chunks(data):
+        update_summary(summary, chunk)
+    save_summary(summary, name)
 
 
 # ========================
 # 3️⃣ Temperature Trend Plot
 # ========================
-def plot_temperature_trends(df, name, date_col="dt"):
-    """Plot temperature trends (auto-detect column)."""
-    if df.empty or date_col not in df.columns:
-        print(f"⚠️ Skipping {name} trend plot.")
+def new_trend():
+    """Empty monthly sum/count accumulator for update_trend()."""
+    return {
+        "sums": defaultdict(float),
+        "counts": defaultdict(int),
+        "first": None,  # month range seen, so months without readings stay as gaps
+        "last": None,
+        "temp_col": None,
+        "problem": None,
+    }
+
+
+def update_trend(trend, chunk, date_col="dt"):
+    """Bucket one chunk's temperatures by month into the accumulator."""
+    if trend["problem"]:
         return
-
-    temp_col = find_temperature_column(df)
+    if date_col not in chunk.columns:
+        trend["problem"] = "skip"
+        return
+    if chunk.empty:  # Parquet batches and skipped bad lines can leave 0-row chunks
+        return
+    temp_col = trend["temp_col"] = trend["temp_col"] or find_temperature_column(chunk)
     if not temp_col:
+        trend["problem"] = "no_temp"
+        return
+
+    # Bucket on int64 months since epoch instead of building Period objects
+    months = chunk[date_col].values.astype("datetime64[M]")
+    valid = ~np.isnat(months)
+    keys = months[valid].view("int64")
+    if keys.size == 0:
+        return
+    values = chunk[temp_col].to_numpy(dtype=np.float32, na_value=np.nan)[valid]
+
+    # Dense accumulator over this chunk's month range, no hashing
+    first, last = keys.min(), keys.max()
+    trend["first"] = first if trend["first"] is None else min(trend["first"], first)
+    trend["last"] = last if trend["last"] is None else max(trend["last"], last)
+    chunk_sums, chunk_counts = bucket_sums(keys - first, values, int(last - first) + 1)
+    for offset in np.flatnonzero(chunk_counts):
+        trend["sums"][first + offset] += chunk_sums[offset]
+        trend["counts"][first + offset] += chunk_counts[offset]
+
+
+def save_trend_plot(trend, name):
+    """Plot the accumulated monthly means to /visuals."""
+    if trend["problem"] == "no_temp":
         print(f"⚠️ No temperature column found in {name}.")
         return
+    if trend["problem"] or not trend["counts"]:
+        print(f"⚠️ Skipping {name} trend plot.")
+        return
 
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    monthly = df.groupby(df[date_col].dt.to_period("M"))[temp_col].mean().reset_index()
-    monthly[date_col] = monthly[date_col].dt.to_timestamp()
-
-    plt.figure()
-    plt.plot(monthly[date_col], monthly[temp_col], color="royalblue")
-    plt.title(f"{name} - Average Temperature Trend")
-    plt.xlabel("Year")
-    plt.ylabel("Temperature (°C)")
-    plt.tight_layout()
-    plt.savefig(os.path.join(VISUALS_DIR, f"{name}_temp_trend.png"))
-    plt.close()
+    # Every month in range, NaN where nothing was recorded, so the line breaks there
+    months = np.arange(trend["first"], trend["last"] + 1, dtype="int64")
+    sums = pd.Series(trend["sums"]).reindex(months, fill_value=0.0)
+    counts = pd.Series(trend["counts"]).reindex(months, fill_value=0)
+    monthly = (sums / counts).where(counts > 0)
+    monthly.index = months.view("datetime64[M]").astype("datetime64[ns]")
+
+    AX.clear()
+    AX.plot(monthly.index, monthly.values, color="royalblue")
+    AX.set_title(f"{name} - Average Temperature Trend")
+    AX.set_xlabel("Year")
+    AX.set_ylabel("Temperature (°C)")
+    FIG.tight_layout()
+    FIG.savefig(os.path.join(VISUALS_DIR, f"{name}_temp_trend.png"))
     print(f"📈 Saved {name} temperature trend plot.")
 
 
-# Run temperature trend plots
-plot_temperature_trends(global_temp, "GlobalTemperatures")
-plot_temperature_trends(country_temp, "GlobalLandTemperaturesByCountry")
-plot_temperature_trends(city_temp, "GlobalLandTemperaturesByCity")
+def plot_temperature_trends(data, name, date_col="dt"):
+    """Plot monthly temperature trends (auto-detect column, streams chunks)."""
+    trend = new_trend()
+    for chunk in iter_chunks(data):
+        update_trend(trend, chunk, date_col)
+    save_trend_plot(trend, name)
+
+
+def summarize_and_plot_stream(filename, summary_name, trend_name):
+    """Summary and trend plot of a streamed dataset from a single pass over its chunks."""
+    summary, trend = new_summary(), new_trend()
+    try:
+        for chunk in stream_dataset(filename):
+            update_summary(summary, chunk)
+            update_trend(trend, chunk)
+    except Exception as e:
+        # Don't save a summary or plot of whatever was read before the failure
+        print(f"❌ Error streaming {filename}: {e}")
+        return
+    save_summary(summary, summary_name)
+    save_trend_plot(trend, trend_name)
 
 
 # ========================
 # 4️⃣ Air Quality Distribution
 # ========================
-if not air_quality.empty:
-    numeric_cols = air_quality.select_dtypes(include="number").columns
+def plot_air_quality_distribution(air_quality):
+    """Histogram of the first numeric air quality column."""
+    if air_quality.empty:
+        return
+    numeric_cols, _ = air_quality_columns(air_quality)
     if len(numeric_cols) > 0:
-        plt.figure()
-        sns.histplot(air_quality[numeric_cols[0]], kde=True, color="teal")
-        plt.title(f"Distribution of {numeric_cols[0]} (Air Quality)")
-        plt.xlabel(numeric_cols[0])
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "air_quality_distribution.png"))
-        plt.close()
+        AX.clear()
+        sns.histplot(air_quality[numeric_cols[0]], kde=True, color="teal", ax=AX)
+        AX.set_title(f"Distribution of {numeric_cols[0]} (Air Quality)")
+        AX.set_xlabel(numeric_cols[0])
+        FIG.tight_layout()
+        FIG.savefig(os.path.join(VISUALS_DIR, "air_quality_distribution.png"))
         print(f"🌫️ Saved air quality distribution plot.")
     else:
         print("⚠️ No numeric columns found in openaq.csv for AQI analysis.")
@@ -132,28 +322,33 @@ if not air_quality.empty:
 # 5️⃣ Correlation Analysis
 # ========================
 def correlation_analysis(df1, df2, label1, label2):
-    """Compare average temperature vs AQI mean."""
-    if df1.empty or df2.empty:
+    """Compare average temperature vs AQI mean (df1 may be a chunk iterator)."""
+    if df2.empty or (isinstance(df1, pd.DataFrame) and df1.empty):
         print("⚠️ Skipping correlation (missing dataset).")
         return
 
     try:
-        df1 = df1.copy()
-        df2 = df2.copy()
-
-        # --- Temperature dataset ---
-        df1["dt"] = pd.to_datetime(df1["dt"], errors="coerce")
-        temp_col = find_temperature_column(df1)
-        if not temp_col:
-            print("⚠️ No temperature column found for correlation.")
+        # --- Temperature dataset (yearly sums/counts, chunk by chunk) ---
+        sums = defaultdict(float)
+        counts = defaultdict(int)
+        temp_col = None
+        for chunk in iter_chunks(df1):
+            temp_col = temp_col or find_temperature_column(chunk)
+            if not temp_col:
+                print("⚠️ No temperature column found for correlation.")
+                return
+            years = chunk["dt"].dt.year
+            g = chunk.groupby(years)[temp_col].agg(["sum", "count"])
+            for year, total, n in zip(g.index, g["sum"], g["count"]):
+                sums[year] += total
+                counts[year] += n
+        if not counts:
+            print("⚠️ Skipping correlation (missing dataset).")
             return
-        temp_avg = df1.groupby(df1["dt"].dt.year)[temp_col].mean()
+        temp_avg = (pd.Series(sums) / pd.Series(counts)).sort_index()
 
         # --- Air quality dataset ---
-        date_col = "Last Updated" if "Last Updated" in df2.columns else "Date"
-        df2[date_col] = pd.to_datetime(df2[date_col], errors="coerce")
-
-        numeric_cols = df2.select_dtypes(include="number").columns
+        numeric_cols, date_col = air_quality_columns(df2)
         if len(numeric_cols) == 0:
             print("⚠️ No numeric air quality data found.")
             return
@@ -164,14 +359,49 @@ def correlation_analysis(df1, df2, label1, label2):
         print(f"🔗 Correlation between temperature and AQI: {corr:.3f}")
 
         combined = pd.DataFrame({"Temp": temp_avg, "AQI": aqi_avg}).dropna()
-        plt.figure()
-        sns.regplot(x="Temp", y="AQI", data=combined, color="darkorange")
-        plt.title(f"{label1} vs {label2} Correlation (r={corr:.2f})")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "temp_aqi_correlation.png"))
-        plt.close()
+        AX.clear()
+        sns.regplot(x="Temp", y="AQI", data=combined, color="darkorange", ax=AX)
+        AX.set_title(f"{label1} vs {label2} Correlation (r={corr:.2f})")
+        FIG.tight_layout()
+        FIG.savefig(os.path.join(VISUALS_DIR, "temp_aqi_correlation.png"))
 
         print("📊 Saved temperature vs AQI correlation plot.")
 
     except Exception as e:
         print(f"❌ Correlation analysis failed: {e}")
+
+
+# ========================
+# 6️⃣ Script Entry Point
+# ========================
+def main():
+    """Load every dataset, then write summaries and plots to /visuals."""
+    # City-level temperatures are streamed (see stream_dataset) rather than loaded
+    country_temp = load_dataset("GlobalLandTemperaturesByCountry.csv")
+    major_city_temp = load_dataset("GlobalLandTemperaturesByMajorCity.csv")
+    state_temp = load_dataset("GlobalLandTemperaturesByState.csv")
+    global_temp = load_dataset("GlobalTemperatures.csv")
+    air_quality = load_dataset("openaq.csv")
+    air_quality_columns(air_quality)
+
+    print("\n📦 All datasets loaded successfully!\n")
+
+    # The city file is the largest: read it once for both its summary and trend plot
+    summarize_and_plot_stream("GlobalLandTemperaturesByCity.csv", "city_temp", "GlobalLandTemperaturesByCity")
+
+    # Generate summaries
+    dataset_summary(country_temp, "country_temp")
+    dataset_summary(major_city_temp, "major_city_temp")
+    dataset_summary(state_temp, "state_temp")
+    dataset_summary(global_temp, "global_temp")
+    dataset_summary(air_quality, "air_quality")
+
+    # Run temperature trend plots
+    plot_temperature_trends(global_temp, "GlobalTemperatures")
+    plot_temperature_trends(country_temp, "GlobalLandTemperaturesByCountry")
+
+    plot_air_quality_distribution(air_quality)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+convert_to_parquet.py
+---------------------
+One-time conversion of the raw CSV datasets to Parquet.
+
+The loaders in data_loader.py pick up ``<name>.parquet`` automatically when it
+is newer than ``<name>.csv``, so re-run this script after replacing a CSV.
+"""
+
+import os
+
+import pyarrow.csv as pac
+import pyarrow.parquet as pq
+
+from data_loader import DATA_DIR, DTYPES, arrow_column_types, sniff_csv
+
+DATASETS = [
+    "GlobalLandTemperaturesByCity.csv",
+    "GlobalLandTemperaturesByCountry.csv",
+    "GlobalLandTemperaturesByMajorCity.csv",
+    "GlobalLandTemperaturesByState.csv",
+    "GlobalTemperatures.csv",
+    "openaq.csv",
+]
+
+
+def convert_csv(file_name):
+    """Stream one CSV into a zstd-compressed Parquet file next to it."""
+    csv_path = os.path.join(DATA_DIR, file_name)
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    sep, header = sniff_csv(csv_path)
+    categorical = [c for c, t in DTYPES.get(file_name, {}).items() if t == "category" and c in header]
+
+    reader = pac.open_csv(
+        csv_path,
+        parse_options=pac.ParseOptions(delimiter=sep, invalid_row_handler=lambda row: "skip"),
+        convert_options=pac.ConvertOptions(
+            column_types=arrow_column_types(file_name, header),
+            strings_can_be_null=True,
+        ),
+    )
+    # Write beside the target and swap in only on success: a half-written file
+    # would be newer than the CSV, and the loaders would silently prefer it
+    tmp_path = parquet_path + ".tmp"
+    try:
+        with pq.ParquetWriter(
+            tmp_path, reader.schema, compression="zstd", use_dictionary=categorical or True
+        ) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, parquet_path)
+    print(f"✅ Converted: {file_name} → {os.path.basename(parquet_path)}")
+
+
+def convert_all():
+    """Convert every dataset CSV that is present in the data folder."""
+    for file_name in DATASETS:
+        if not os.path.exists(os.path.join(DATA_DIR, file_name)):
+            print(f"⚠️ Skipping {file_name} — not found.")
+            continue
+        try:
+            convert_csv(file_name)
+        except Exception as e:
+            print(f"❌ Error converting {file_name}: {e}")
+
+    print("\n📦 Parquet conversion finished!\n")
+
+
+if __name__ == "__main__":
+    convert_all()
@@ -12,8 +12,8 @@ def clean_temperature_data(df):
     if df.empty:
         return df
 
-    # Standardize column names
-    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    # Standardize column names (one pass, no intermediate Index objects)
+    df.columns = [c.strip().lower().replace(' ', '_') for c in df.columns]
 
     # Convert date column to datetime if it exists
     if 'dt' in df.columns:
@@ -21,8 +21,8 @@ def clean_temperature_data(df):
 
     # Drop rows where temperature is missing
     temp_cols = [col for col in df.columns if 'average' in col or 'temperature' in col]
-    for col in temp_cols:
-        df = df[df[col].notna()]
+    if temp_cols:
+        df = df.loc[df[temp_cols].notna().all(axis=1)]
 
     # Remove duplicates
     df = df.drop_duplicates()
@@ -44,9 +44,8 @@ def clean_air_quality_data(df):
             print(f"❌ Error while fixing OpenAQ data: {e}")
             return pd.DataFrame()
 
-    # Ensure column names are strings before cleaning
-    df.columns = df.columns.map(str)
-    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    # Ensure column names are strings before cleaning (split columns are ints)
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
 
     # Drop empty rows
     df = df.dropna(how='all')
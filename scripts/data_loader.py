@@ -4,19 +4,224 @@ data_loader.py
 Loads all datasets required for the Global Air Quality Analysis project.
 """
 
+import csv
 import pandas as pd
 import os
 
-# Base directory for your data
-DATA_DIR = os.path.join("data")
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pac
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSVs then go through the pandas C parser
+    pa = None
+
+# Base directory for your data (resolved from this file, not the working directory)
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# Rows per chunk when streaming large files (~128–256 MB parsed per block)
+CHUNKSIZE = 1_000_000
+
+# Bytes per block for pyarrow's multi-threaded CSV reader (keeps workers cache-warm)
+ARROW_BLOCK_SIZE = 8 << 20
+
+# How much of a file to inspect when guessing its separator
+SNIFF_BYTES = 65536
+SEPARATORS = (",", ";", "|")
+
+# Explicit dtypes per file: every temperature column is float32 (plots show two
+# decimals, so float64 only doubles memory), place names are categorical
+DTYPES = {
+    "GlobalLandTemperaturesByCity.csv": {
+        "AverageTemperature": "float32",
+        "AverageTemperatureUncertainty": "float32",
+        "City": "category",
+        "Country": "category",
+    },
+    "GlobalLandTemperaturesByCountry.csv": {
+        "AverageTemperature": "float32",
+        "AverageTemperatureUncertainty": "float32",
+        "Country": "category",
+    },
+    "GlobalLandTemperaturesByMajorCity.csv": {
+        "AverageTemperature": "float32",
+        "AverageTemperatureUncertainty": "float32",
+        "City": "category",
+        "Country": "category",
+    },
+    "GlobalLandTemperaturesByState.csv": {
+        "AverageTemperature": "float32",
+        "AverageTemperatureUncertainty": "float32",
+        "State": "category",
+        "Country": "category",
+    },
+    "GlobalTemperatures.csv": {
+        "LandAverageTemperature": "float32",
+        "LandAverageTemperatureUncertainty": "float32",
+        "LandMaxTemperature": "float32",
+        "LandMaxTemperatureUncertainty": "float32",
+        "LandMinTemperature": "float32",
+        "LandMinTemperatureUncertainty": "float32",
+        "LandAndOceanAverageTemperature": "float32",
+        "LandAndOceanAverageTemperatureUncertainty": "float32",
+    },
+}
+
+# Date columns parsed once at load time, so the analysis never re-parses them
+DATE_FORMATS = {
+    "dt": "%Y-%m-%d",
+    "Last Updated": "ISO8601",
+    "Date": "ISO8601",
+}
+# OpenAQ timestamps carry offsets; the Berkeley "dt" dates stay tz-naive
+UTC_DATE_COLUMNS = {"Last Updated", "Date"}
+
+# Columns the analysis actually reads; files not listed are loaded in full
+# (openaq.csv column names vary between exports, so it is matched by keyword)
+USECOLS = {
+    "GlobalLandTemperaturesByCity.csv": ["dt", "AverageTemperature", "City", "Country"],
+    "GlobalLandTemperaturesByCountry.csv": ["dt", "AverageTemperature", "Country"],
+    "GlobalLandTemperaturesByMajorCity.csv": ["dt", "AverageTemperature", "City", "Country"],
+    "GlobalLandTemperaturesByState.csv": ["dt", "AverageTemperature", "State", "Country"],
+    "GlobalTemperatures.csv": ["dt", "LandAverageTemperature"],
+}
+
+
+def sniff_csv(file_path):
+    """Guess the separator from the first 64 KB and return (sep, header columns)."""
+    with open(file_path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+    text = sample.decode("utf-8", errors="ignore")
+    header_line = text.splitlines()[0] if text else ""
+
+    try:
+        sep = csv.Sniffer().sniff(text, delimiters="".join(SEPARATORS)).delimiter
+    except csv.Error:
+        # Sniffer gave up: pick whichever separator dominates the header
+        counts = {s: header_line.count(s) for s in SEPARATORS}
+        sep = max(counts, key=counts.get) if any(counts.values()) else ","
+
+    header = [c.strip('"') for c in header_line.split(sep)]
+    return sep, header
+
+
+def csv_read_options(file_path, file_name=None, usecols=None, dtype=None):
+    """Build C-engine ``pd.read_csv`` keyword arguments for a dataset file.
+
+    ``usecols``/``dtype`` override the per-file defaults in USECOLS/DTYPES.
+    """
+    file_name = file_name or os.path.basename(file_path)
+    sep, header = sniff_csv(file_path)
+
+    wanted = usecols if usecols is not None else USECOLS.get(file_name)
+    if wanted is not None:
+        usecols = [c for c in header if c in wanted]
+    dtype = dtype if dtype is not None else DTYPES.get(file_name, {})
+    dtype = {c: t for c, t in dtype.items() if c in header}
+
+    options = {
+        "sep": sep,
+        "engine": "c",
+        "on_bad_lines": "skip",
+        "usecols": usecols or None,
+        "dtype": dtype or None,
+    }
+    date_cols = [c for c in DATE_FORMATS if c in (usecols or header)]
+    if date_cols:
+        options.update(
+            parse_dates=date_cols,
+            cache_dates=True,
+            date_format={c: DATE_FORMATS[c] for c in date_cols},
+        )
+    return options
+
+
+def arrow_column_types(file_name, header):
+    """Arrow column types for a CSV, mirroring the pandas DTYPES for that file."""
+    arrow_types = {
+        "float32": pa.float32(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+    column_types = {
+        col: arrow_types[dtype]
+        for col, dtype in DTYPES.get(file_name, {}).items()
+        if col in header
+    }
+    if "dt" in header:
+        column_types["dt"] = pa.timestamp("ms")
+    return column_types
+
+
+def read_csv_arrow(file_path, file_name=None):
+    """Parse a whole CSV with pyarrow's multi-threaded reader into a DataFrame."""
+    file_name = file_name or os.path.basename(file_path)
+    sep, header = sniff_csv(file_path)
+    wanted = USECOLS.get(file_name)
+
+    table = pac.read_csv(
+        file_path,
+        read_options=pac.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE),
+        parse_options=pac.ParseOptions(delimiter=sep, invalid_row_handler=lambda row: "skip"),
+        convert_options=pac.ConvertOptions(
+            column_types=arrow_column_types(file_name, header),
+            include_columns=[c for c in header if c in wanted] if wanted is not None else None,
+            strings_can_be_null=True,
+        ),
+    )
+    # Plain numpy/categorical columns, which is what the analysis code expects
+    return table.to_pandas()
+
+
+def normalize_dates(df):
+    """Coerce any known date column the reader left unparsed to datetime."""
+    for col in DATE_FORMATS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=col in UTC_DATE_COLUMNS)
+    return df
+
+
+def parquet_path_for(file_path):
+    """Return the Parquet copy of a CSV if it exists and is up to date, else None."""
+    parquet_path = os.path.splitext(file_path)[0] + ".parquet"
+    if not os.path.exists(parquet_path):
+        return None
+    if os.path.exists(file_path) and os.path.getmtime(file_path) > os.path.getmtime(parquet_path):
+        return None  # CSV changed since conversion; don't serve stale data
+    return parquet_path
+
+
+def parquet_columns(parquet_path, wanted):
+    """Intersect wanted column names with those stored in a Parquet file."""
+    if wanted is None:
+        return None
+    names = pq.read_schema(parquet_path).names
+    return [c for c in names if c in wanted]
+
+
+def read_dataset(file_path, file_name=None):
+    """Read a dataset into a DataFrame, preferring its Parquet copy over the CSV."""
+    file_name = file_name or os.path.basename(file_path)
+    parquet_path = parquet_path_for(file_path)
+    if parquet_path:
+        columns = parquet_columns(parquet_path, USECOLS.get(file_name))
+        df = pd.read_parquet(parquet_path, columns=columns, engine="pyarrow")
+    elif pa is not None:
+        try:
+            df = read_csv_arrow(file_path, file_name)
+        except pa.ArrowInvalid:
+            # Quirks pyarrow rejects (e.g. stray quoting) still parse in pandas
+            df = pd.read_csv(file_path, **csv_read_options(file_path, file_name))
+    else:
+        df = pd.read_csv(file_path, **csv_read_options(file_path, file_name))
+    return normalize_dates(df)
+
 
 def load_dataset(file_name):
     """Load a single CSV file safely and return a pandas DataFrame."""
     file_path = os.path.join(DATA_DIR, file_name)
     try:
-        if not os.path.exists(file_path):
+        if not os.path.exists(file_path) and not parquet_path_for(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
-        df = pd.read_csv(file_path, on_bad_lines='skip')  # 👈 FIX HERE
+        df = read_dataset(file_path, file_name)  # only the USECOLS columns
         print(f"✅ Loaded: {file_name} — Shape: {df.shape}")
         return df
     except Exception as e:
@@ -24,6 +229,28 @@ def load_dataset(file_name):
         return pd.DataFrame()
 
 
+def iter_dataset(file_name, chunksize=CHUNKSIZE, usecols=None, dtype=None):
+    """Stream a CSV file as DataFrame chunks of ``chunksize`` rows.
+
+    Peak memory stays around one chunk instead of the whole file, so callers
+    should reduce each chunk (sums, counts, ...) rather than collect them.
+    """
+    file_path = os.path.join(DATA_DIR, file_name)
+    parquet_path = parquet_path_for(file_path)
+    if parquet_path:
+        columns = parquet_columns(parquet_path, usecols if usecols is not None else USECOLS.get(file_name))
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunksize, columns=columns):
+            yield normalize_dates(batch.to_pandas())
+        return
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    options = csv_read_options(file_path, file_name, usecols=usecols, dtype=dtype)
+    with pd.read_csv(file_path, chunksize=chunksize, **options) as reader:
+        for chunk in reader:
+            yield normalize_dates(chunk)
+
+
 def load_all_datasets():
     """Load all required datasets and return as a dictionary."""
     datasets = {
@@ -9,6 +9,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from data_loader import read_dataset
+
 sns.set(style="whitegrid")
 plt.rcParams["figure.figsize"] = (10, 6)
 
@@ -22,10 +24,10 @@ os.makedirs(VISUALS_DIR, exist_ok=True)
 # 1️⃣ Safe Loader
 # ========================
 def load_dataset(filename):
-    """Load CSV safely with fallback options."""
+    """Load a dataset safely (Parquet copy if present, else the C CSV parser)."""
     path = os.path.join(DATA_DIR, filename)
     try:
-        df = pd.read_csv(path, on_bad_lines="skip", sep=None, engine="python")
+        df = read_dataset(path)
         print(f"✅ Loaded: {filename} — Shape: {df.shape}")
         return df
     except Exception as e:
@@ -1,175 +1,316 @@
+import multiprocessing as mp
 import os
+import pickle
+import tempfile
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: files only, no GUI backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from data_loader import parquet_path_for, read_dataset
+
 # ========== Setup ==========
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 VISUALS_DIR = os.path.join(BASE_DIR, "visuals")
+# Kept out of VISUALS_DIR, which app.py serves as-is
+CACHE_DIR = os.path.join(DATA_DIR, "_cache")
 os.makedirs(VISUALS_DIR, exist_ok=True)
 
 sns.set(style="whitegrid")
 plt.rcParams["figure.figsize"] = (10, 6)
-print("📊 Starting visualizer...")
+
+# One figure reused for every plot (cleared in between) instead of one per plot
+FIG, AX = plt.subplots()
+
+def clear_axes():
+    """Reset the shared axes; clear() alone keeps the pie chart's aspect and frame."""
+    AX.clear()
+    AX.set_aspect("auto")
+    AX.set_frame_on(True)
 
 # ========== Safe CSV loader ==========
 def safe_load_csv(filename):
     path = os.path.join(DATA_DIR, filename)
     try:
-        # Try normal read
-        df = pd.read_csv(path, engine="python", on_bad_lines="skip")
-        # If single column -> try other separators
-        if df.shape[1] == 1:
-            try:
-                df = pd.read_csv(path, sep=";", engine="python", on_bad_lines="skip")
-            except Exception:
-                df = pd.read_csv(path, sep="|", engine="python", on_bad_lines="skip")
+        # Parquet if converted, else one C-engine pass with a sniffed separator
+        df = read_dataset(path)
         print(f"✅ Loaded: {filename} — Shape: {df.shape}")
         return df
     except Exception as e:
         print(f"❌ Error loading {filename}: {e}")
         return pd.DataFrame()
 
-# ========== Load Datasets ==========
-air = safe_load_csv("openaq.csv")
-temp = safe_load_csv("GlobalTemperatures.csv")
+# ========== Aggregate cache ==========
+def source_key(filename):
+    """(mtime, size) of the file a dataset is actually read from."""
+    path = os.path.join(DATA_DIR, filename)
+    path = parquet_path_for(path) or path
+    return (os.path.getmtime(path), os.path.getsize(path))
 
-# Stop if both failed
-if air.empty and temp.empty:
-    print("❌ Both datasets failed to load. Exiting.")
-    exit()
+def load_cached(name, key):
+    """Return the cached entry stored under ``key``, or None if missing/stale."""
+    try:
+        with open(os.path.join(CACHE_DIR, f"{name}.pkl"), "rb") as f:
+            entry = pickle.load(f)
+    except Exception:
+        # Unreadable for any reason (truncated, written by another pandas) is a miss
+        return None
+    return entry if isinstance(entry, dict) and entry.get("key") == key else None
 
-print("🔎 Air Quality Columns:", air.columns.tolist())
-print("🔎 Temperature Columns:", temp.columns.tolist())
+def store_cached(name, key, result, png_path):
+    """Persist an aggregate together with the plot rendered from it."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entry = {"key": key, "result": result, "png": png_path, "png_mtime": os.path.getmtime(png_path)}
+    with open(os.path.join(CACHE_DIR, f"{name}.pkl"), "wb") as f:
+        pickle.dump(entry, f)
 
-# ========== Clean headers safely ==========
-if not air.empty:
-    air.columns = air.columns.map(str).str.strip().str.lower()
-if not temp.empty:
-    temp.columns = temp.columns.map(str).str.strip().str.lower()
+def cached_png_current(entry):
+    """True if the PNG rendered alongside ``entry`` has not been replaced since."""
+    try:
+        return os.path.getmtime(entry["png"]) == entry["png_mtime"]
+    except (OSError, KeyError):
+        return False
 
 # ========== Column detection ==========
 def find_col(cols, keywords):
-    for key in keywords:
-        for c in cols:
-            if key in c:
-                return c
-    return None
-
-city_col = find_col(air.columns, ["city"])
-country_col = find_col(temp.columns, ["country"])
-pollutant_col = find_col(air.columns, ["pollutant"])
-value_col = find_col(air.columns, ["value", "concentration", "pm25", "pm2.5"])
-date_col = find_col(air.columns, ["date", "last updated", "utc"])
-temp_col = find_col(temp.columns, ["averagetemperature", "landaveragetemperature"])
-temp_date_col = find_col(temp.columns, ["dt"])
+    # Headers are already stripped/lower-cased; keyword order sets priority
+    return next((c for key in keywords for c in cols if key in c), None)
+
+def year_of(dates):
+    """int64 calendar year of each non-NaT timestamp, plus the mask selecting those rows."""
+    years = dates.values.astype("datetime64[Y]")
+    valid = ~np.isnat(years)
+    return years[valid].view("int64") + 1970, valid
+
+def top_means(groups, values, n=10):
+    """Largest ``n`` per-category means of ``values``, descending, via np.bincount."""
+    codes = groups.cat.codes.to_numpy()
+    values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = (codes >= 0) & ~np.isnan(values)
+    n_groups = len(groups.cat.categories)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=n_groups)
+    counts = np.bincount(codes[valid], minlength=n_groups)
+
+    observed = np.flatnonzero(counts)
+    means = sums[observed] / counts[observed]
+    k = min(n, len(means))
+    if k == 0:
+        return pd.Series(dtype="float64")
+    # Partial selection of the top k, then sort just those k
+    top = np.argpartition(-means, k - 1)[:k]
+    top = top[np.argsort(-means[top], kind="stable")]
+    return pd.Series(means[top], index=groups.cat.categories[observed[top]])
+
+# ========== Load Datasets ==========
+def prepare_data():
+    """Load, clean and inspect both datasets; returns (air, temp, cols) or None."""
+    air = safe_load_csv("openaq.csv")
+    temp = safe_load_csv("GlobalTemperatures.csv")
+
+    # Stop if both failed
+    if air.empty and temp.empty:
+        print("❌ Both datasets failed to load. Exiting.")
+        return None
+
+    print("🔎 Air Quality Columns:", air.columns.tolist())
+    print("🔎 Temperature Columns:", temp.columns.tolist())
+
+    # Clean headers safely
+    if not air.empty:
+        air.columns = [str(c).strip().lower() for c in air.columns]
+    if not temp.empty:
+        temp.columns = [str(c).strip().lower() for c in temp.columns]
+
+    cols = {
+        "city": find_col(air.columns, ["city"]),
+        "country": find_col(temp.columns, ["country"]),
+        "pollutant": find_col(air.columns, ["pollutant"]),
+        "value": find_col(air.columns, ["value", "concentration", "pm25", "pm2.5"]),
+        "date": find_col(air.columns, ["date", "last updated", "utc"]),
+        "temp": find_col(temp.columns, ["averagetemperature", "landaveragetemperature"]),
+        "temp_date": find_col(temp.columns, ["dt"]),
+    }
+
+    # Few distinct values over many rows: int codes make groupby/value_counts cheap
+    for frame, key in ((air, "city"), (air, "pollutant"), (temp, "country")):
+        if cols[key]:
+            frame[cols[key]] = frame[cols[key]].astype("category")
+
+    return air, temp, cols
 
 # ========== VISUAL 1: Top Polluted Cities ==========
-try:
-    if city_col and value_col:
-        air[city_col] = air[city_col].astype(str)
-        city_avg = air.groupby(city_col)[value_col].mean().sort_values(ascending=False).head(10)
-        plt.figure()
-        sns.barplot(x=city_avg.values, y=city_avg.index, palette="rocket")
-        plt.title("🌆 Top 10 Most Polluted Cities")
-        plt.xlabel("Average AQI Value")
-        plt.ylabel("City")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "top_10_polluted_cities.png"))
-        plt.close()
-        print("📈 Saved: Top Polluted Cities Plot")
-    else:
-        raise KeyError(f"Missing columns — city_col: {city_col}, value_col: {value_col}")
-except Exception as e:
-    print(f"⚠️ Skipped Top Polluted Cities plot: '{e}'")
+def plot_top_cities(air, temp, cols):
+    """Top 10 polluted cities by mean pollutant value."""
+    city_col, value_col = cols["city"], cols["value"]
+    try:
+        if city_col and value_col:
+            png_path = os.path.join(VISUALS_DIR, "top_10_polluted_cities.png")
+            key = source_key("openaq.csv") + (city_col, value_col)
+            cached = load_cached("top_cities", key)
+            if cached and cached_png_current(cached):
+                print("♻️ Reused: Top Polluted Cities Plot (source unchanged)")
+            else:
+                if cached:
+                    city_avg = cached["result"]
+                else:
+                    city_avg = air.groupby(city_col, observed=True)[value_col].mean().sort_values(ascending=False).head(10)
+                clear_axes()
+                # Plain string labels, or seaborn would lay out every category on the axis
+                sns.barplot(x=city_avg.values, y=city_avg.index.astype(str), palette="rocket", ax=AX)
+                AX.set_title("🌆 Top 10 Most Polluted Cities")
+                AX.set_xlabel("Average AQI Value")
+                AX.set_ylabel("City")
+                FIG.tight_layout()
+                FIG.savefig(png_path)
+                store_cached("top_cities", key, city_avg, png_path)
+                print("📈 Saved: Top Polluted Cities Plot")
+        else:
+            raise KeyError(f"Missing columns — city_col: {city_col}, value_col: {value_col}")
+    except Exception as e:
+        print(f"⚠️ Skipped Top Polluted Cities plot: '{e}'")
 
 # ========== VISUAL 2: Hottest Countries ==========
-try:
-    if country_col and temp_col:
-        country_avg = temp.groupby(country_col)[temp_col].mean().sort_values(ascending=False).head(10)
-        plt.figure()
-        sns.barplot(x=country_avg.values, y=country_avg.index, palette="coolwarm")
-        plt.title("🌡️ Top 10 Hottest Countries")
-        plt.xlabel("Average Temperature (°C)")
-        plt.ylabel("Country")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "top_10_hottest_countries.png"))
-        plt.close()
-        print("📈 Saved: Hottest Countries Plot")
-    else:
-        raise KeyError(f"Missing columns — country_col: {country_col}, temp_col: {temp_col}")
-except Exception as e:
-    print(f"⚠️ Skipped Hottest Countries plot: '{e}'")
+def plot_hottest_countries(air, temp, cols):
+    """Top 10 countries by mean temperature."""
+    country_col, temp_col = cols["country"], cols["temp"]
+    try:
+        if country_col and temp_col:
+            png_path = os.path.join(VISUALS_DIR, "top_10_hottest_countries.png")
+            key = source_key("GlobalTemperatures.csv") + (country_col, temp_col)
+            cached = load_cached("hottest_countries", key)
+            if cached and cached_png_current(cached):
+                print("♻️ Reused: Hottest Countries Plot (source unchanged)")
+            else:
+                if cached:
+                    country_avg = cached["result"]
+                else:
+                    country_avg = top_means(temp[country_col], temp[temp_col])
+                clear_axes()
+                sns.barplot(x=country_avg.values, y=country_avg.index.astype(str), palette="coolwarm", ax=AX)
+                AX.set_title("🌡️ Top 10 Hottest Countries")
+                AX.set_xlabel("Average Temperature (°C)")
+                AX.set_ylabel("Country")
+                FIG.tight_layout()
+                FIG.savefig(png_path)
+                store_cached("hottest_countries", key, country_avg, png_path)
+                print("📈 Saved: Hottest Countries Plot")
+        else:
+            raise KeyError(f"Missing columns — country_col: {country_col}, temp_col: {temp_col}")
+    except Exception as e:
+        print(f"⚠️ Skipped Hottest Countries plot: '{e}'")
 
 # ========== VISUAL 3: Global Temperature Trend ==========
-try:
-    if temp_date_col and temp_col:
-        temp[temp_date_col] = pd.to_datetime(temp[temp_date_col], errors="coerce")
-        yearly = temp.groupby(temp[temp_date_col].dt.year)[temp_col].mean().dropna()
-        plt.figure()
-        plt.plot(yearly.index, yearly.values, color="orange", linewidth=2.5)
-        plt.title("📈 Global Average Temperature Over Years")
-        plt.xlabel("Year")
-        plt.ylabel("Temperature (°C)")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "global_temperature_trend.png"))
-        plt.close()
-        print("📈 Saved: Global Temperature Trend")
-    else:
-        raise KeyError(f"Missing columns — temp_date_col: {temp_date_col}, temp_col: {temp_col}")
-except Exception as e:
-    print(f"⚠️ Skipped Global Temperature Trend plot: '{e}'")
+def plot_temp_trend(air, temp, cols):
+    """Yearly global average temperature."""
+    temp_date_col, temp_col = cols["temp_date"], cols["temp"]
+    try:
+        if temp_date_col and temp_col:
+            years, valid = year_of(temp[temp_date_col])
+            yearly = temp.loc[valid, temp_col].groupby(years).mean().dropna()
+            clear_axes()
+            AX.plot(yearly.index, yearly.values, color="orange", linewidth=2.5)
+            AX.set_title("📈 Global Average Temperature Over Years")
+            AX.set_xlabel("Year")
+            AX.set_ylabel("Temperature (°C)")
+            FIG.tight_layout()
+            FIG.savefig(os.path.join(VISUALS_DIR, "global_temperature_trend.png"))
+            print("📈 Saved: Global Temperature Trend")
+        else:
+            raise KeyError(f"Missing columns — temp_date_col: {temp_date_col}, temp_col: {temp_col}")
+    except Exception as e:
+        print(f"⚠️ Skipped Global Temperature Trend plot: '{e}'")
 
 # ========== VISUAL 4: AQI vs Temperature Correlation ==========
-try:
-    if date_col and temp_date_col and value_col and temp_col:
-        air[date_col] = pd.to_datetime(air[date_col], errors="coerce")
-        temp[temp_date_col] = pd.to_datetime(temp[temp_date_col], errors="coerce")
-
-        air["year"] = air[date_col].dt.year
-        temp["year"] = temp[temp_date_col].dt.year
-
-        merged = pd.merge(
-            air.groupby("year")[value_col].mean(),
-            temp.groupby("year")[temp_col].mean(),
-            left_index=True,
-            right_index=True,
-            how="inner"
-        )
-
-        plt.figure()
-        sns.regplot(x=temp_col, y=value_col, data=merged, color="green")
-        plt.title("🌡️ Temperature vs AQI Correlation")
-        plt.xlabel("Average Temperature (°C)")
-        plt.ylabel("Average AQI")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "temp_vs_aqi_correlation.png"))
-        plt.close()
-        print("📊 Saved: AQI vs Temperature Correlation")
-    else:
-        raise KeyError(
-            f"Missing columns — date_col: {date_col}, temp_date_col: {temp_date_col}, temp_col: {temp_col}, value_col: {value_col}"
-        )
-except Exception as e:
-    print(f"⚠️ Skipped Correlation plot: '{e}'")
+def plot_corr(air, temp, cols):
+    """Yearly mean AQI against yearly mean temperature."""
+    date_col, temp_date_col, value_col, temp_col = cols["date"], cols["temp_date"], cols["value"], cols["temp"]
+    try:
+        if date_col and temp_date_col and value_col and temp_col:
+            # dt is parsed by the loader; the keyword-matched air column may not be
+            air[date_col] = pd.to_datetime(air[date_col], errors="coerce")
+
+            air_years, air_valid = year_of(air[date_col])
+            temp_years, temp_valid = year_of(temp[temp_date_col])
+
+            merged = pd.merge(
+                air.loc[air_valid, value_col].groupby(air_years).mean(),
+                temp.loc[temp_valid, temp_col].groupby(temp_years).mean(),
+                left_index=True,
+                right_index=True,
+                how="inner"
+            )
+
+            clear_axes()
+            sns.regplot(x=temp_col, y=value_col, data=merged, color="green", ax=AX)
+            AX.set_title("🌡️ Temperature vs AQI Correlation")
+            AX.set_xlabel("Average Temperature (°C)")
+            AX.set_ylabel("Average AQI")
+            FIG.tight_layout()
+            FIG.savefig(os.path.join(VISUALS_DIR, "temp_vs_aqi_correlation.png"))
+            print("📊 Saved: AQI vs Temperature Correlation")
+        else:
+            raise KeyError(
+                f"Missing columns — date_col: {date_col}, temp_date_col: {temp_date_col}, temp_col: {temp_col}, value_col: {value_col}"
+            )
+    except Exception as e:
+        print(f"⚠️ Skipped Correlation plot: '{e}'")
 
 # ========== VISUAL 5: Pollutant Distribution ==========
-try:
-    if pollutant_col:
-        plt.figure()
-        air[pollutant_col].value_counts().head(10).plot(
-            kind="pie", autopct="%1.1f%%", startangle=90, colors=sns.color_palette("pastel")
-        )
-        plt.title("☁️ Pollutant Type Distribution")
-        plt.ylabel("")
-        plt.tight_layout()
-        plt.savefig(os.path.join(VISUALS_DIR, "pollutant_distribution.png"))
-        plt.close()
-        print("🌫️ Saved: Pollutant Distribution Pie Chart")
-    else:
-        raise KeyError(f"Missing pollutant_col: {pollutant_col}")
-except Exception as e:
-    print(f"⚠️ Skipped Pollutant Distribution: '{e}'")
-
-print("\n✅ All advanced visuals saved successfully in /visuals folder.\n")
+def plot_pollutant_dist(air, temp, cols):
+    """Share of the 10 most reported pollutants."""
+    pollutant_col = cols["pollutant"]
+    try:
+        if pollutant_col:
+            clear_axes()
+            air[pollutant_col].value_counts().head(10).plot(
+                kind="pie", autopct="%1.1f%%", startangle=90, colors=sns.color_palette("pastel"), ax=AX
+            )
+            AX.set_title("☁️ Pollutant Type Distribution")
+            AX.set_ylabel("")
+            FIG.tight_layout()
+            FIG.savefig(os.path.join(VISUALS_DIR, "pollutant_distribution.png"))
+            print("🌫️ Saved: Pollutant Distribution Pie Chart")
+        else:
+            raise KeyError(f"Missing pollutant_col: {pollutant_col}")
+    except Exception as e:
+        print(f"⚠️ Skipped Pollutant Distribution: '{e}'")
+
+PLOTS = [plot_top_cities, plot_hottest_countries, plot_temp_trend, plot_corr, plot_pollutant_dist]
+
+# ========== Parallel rendering ==========
+# Each worker process has its own matplotlib state, so plots never share a figure
+_frames = {}
+
+def _init_worker(frames_path):
+    with open(frames_path, "rb") as f:
+        _frames.update(pickle.load(f))
+
+def render(plot):
+    plot(_frames["air"], _frames["temp"], _frames["cols"])
+
+def main():
+    print("📊 Starting visualizer...")
+    data = prepare_data()
+    if data is None:
+        return
+    air, temp, cols = data
+
+    # Hand the cleaned frames to the workers once, through a pickle on disk;
+    # unique per run so overlapping runs never share (or delete) each other's
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, frames_path = tempfile.mkstemp(dir=CACHE_DIR, prefix="frames-", suffix=".pkl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"air": air, "temp": temp, "cols": cols}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with mp.Pool(min(len(PLOTS), os.cpu_count() or 1), initializer=_init_worker, initargs=(frames_path,)) as pool:
+            pool.map(render, PLOTS)
+    finally:
+        os.remove(frames_path)
+
+    print("\n✅ All advanced visuals saved successfully in /visuals folder.\n")
+
+if __name__ == "__main__":
+    main()